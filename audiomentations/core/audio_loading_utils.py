@@ -4,7 +4,9 @@ import librosa
 import numpy as np
 
 
-def load_sound_file(file_path, sample_rate, mono=True, resample_type="auto"):
+def load_sound_file(
+    file_path, sample_rate, mono=True, resample_type="auto", duration=None
+):
     """
     Load an audio file as a floating point time series. Audio will be automatically
     resampled to the given sample rate.
@@ -14,10 +16,12 @@ def load_sound_file(file_path, sample_rate, mono=True, resample_type="auto"):
     :param mono: If True, mix any multichannel data down to mono, and return a 1D array
     :param resample_type: "auto" means use "kaiser_fast" when upsampling and "kaiser_best" when
         downsampling
+    :param duration: If not None, only load up to this many seconds of audio from the
+        start of the file
     """
     file_path = str(file_path)
     samples, actual_sample_rate = librosa.load(
-        str(file_path), sr=None, mono=mono, dtype=np.float32
+        str(file_path), sr=None, mono=mono, dtype=np.float32, duration=duration
     )
 
     if sample_rate is not None and actual_sample_rate != sample_rate:
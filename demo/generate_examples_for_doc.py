@@ -1,16 +1,17 @@
 import argparse
+import concurrent.futures
+import multiprocessing
 import os
 import random
 import sys
 from pathlib import Path
 from typing import Tuple
-from functools import partial
+from functools import lru_cache, partial
 
 import librosa
 import numpy as np
 import soundfile
 from PIL import Image
-from librosa.display import specshow
 from matplotlib import pyplot as plt
 from numpy.typing import NDArray
 
@@ -49,33 +50,82 @@ from audiomentations import (
 )
 from audiomentations.core.audio_loading_utils import load_sound_file
 
+BASE_DIR = Path(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+OUTPUT_DIR = BASE_DIR / "docs" / "waveform_transforms"
+
 transform_usage_example_classes = dict()
 
 
+@lru_cache(maxsize=4)
+def _cached_load(file_path, sample_rate, duration):
+    sound, sample_rate = load_sound_file(
+        file_path, sample_rate=sample_rate, duration=duration
+    )
+    # Shared between examples, so guard against in-place edits
+    sound.flags.writeable = False
+    return sound, sample_rate
+
+
+def load_example_sound(duration=4.7):
+    """Return a writable float32 copy of the start of the librosa "libri1" example."""
+    sound, sample_rate = _cached_load(librosa.example("libri1"), 16000, duration)
+    sound = sound[..., 0 : int(duration * sample_rate)].astype(np.float32)
+    return sound, sample_rate
+
+
+def get_peak_amplitude(samples):
+    """Same as np.amax(np.abs(samples)), without the temporary array."""
+    return max(np.amax(samples), -np.amin(samples))
+
+
+def get_waveform_envelope(samples, n_bins):
+    """Return the min and max of each of n_bins equally sized bins."""
+    pad = (-len(samples)) % n_bins
+    samples = np.pad(samples, (0, pad)).reshape(n_bins, -1)
+    return samples.min(axis=1), samples.max(axis=1)
+
+
+def plot_waveform(ax, samples, n_bins=800):
+    bin_size = -(-len(samples) // n_bins)
+    lower, upper = get_waveform_envelope(samples, n_bins)
+    ax.fill_between(
+        np.arange(n_bins) * bin_size, lower, upper, linewidth=0, rasterized=True
+    )
+
+
+@lru_cache(maxsize=1)
+def get_reusable_figure():
+    """Create the 2x2 figure that is reused for all plots in this process."""
+    return plt.subplots(
+        2,
+        2,
+        figsize=(8, 4),
+        dpi=150,
+        gridspec_kw=dict(width_ratios=[1, 1], height_ratios=[1, 1]),
+    )
+
+
 def plot_waveforms_and_spectrograms(
     sound, transformed_sound, sample_rate, output_file_path
 ):
     xmax = max(sound.shape[0], transformed_sound.shape[0])
-    ylim = max(np.amax(np.abs(sound)), np.amax(np.abs(transformed_sound))) * 1.1
+    ylim = max(get_peak_amplitude(sound), get_peak_amplitude(transformed_sound)) * 1.1
     sound = sound[:xmax]
     transformed_sound = transformed_sound[:xmax]
-    fig, axs = plt.subplots(
-        2,
-        2,
-        gridspec_kw=dict(
-            width_ratios=[sound.shape[-1], transformed_sound.shape[-1]],
-            height_ratios=[1, 1],
-        ),
-    )
+    fig, axs = get_reusable_figure()
+    for ax in axs.flat:
+        ax.clear()
+    width_ratio = np.clip(transformed_sound.shape[-1] / sound.shape[-1], 0.5, 2.0)
+    axs[0, 0].get_gridspec().set_width_ratios([1, width_ratio])
 
-    axs[0, 0].plot(sound)
+    plot_waveform(axs[0, 0], sound)
     axs[0, 0].set_xticklabels([])
     axs[0, 0].set_xticks([])
     axs[0, 0].set_xlim([0, sound.shape[-1]])
     axs[0, 0].set_ylim([-ylim, ylim])
     axs[0, 0].title.set_text("Input sound")
 
-    axs[0, 1].plot(transformed_sound)
+    plot_waveform(axs[0, 1], transformed_sound)
     axs[0, 1].set_xticklabels([])
     axs[0, 1].set_xticks([])
     axs[0, 1].set_xlim([0, transformed_sound.shape[-1]])
@@ -84,8 +134,13 @@ def plot_waveforms_and_spectrograms(
     axs[0, 1].set_yticklabels([])
     axs[0, 1].title.set_text("Transformed sound")
 
+    n_fft = 1024
+    hop_length = 256
+
     def get_magnitude_spectrogram(samples):
-        complex_spec = librosa.stft(samples)
+        complex_spec = librosa.stft(
+            samples, n_fft=n_fft, hop_length=hop_length, dtype=np.complex64
+        )
         return librosa.amplitude_to_db(np.abs(complex_spec), ref=np.max)
 
     sound_spec = get_magnitude_spectrogram(sound)
@@ -94,40 +149,48 @@ def plot_waveforms_and_spectrograms(
     vmax = max(np.amax(sound_spec), np.amax(transformed_sound_spec))
     vmin = vmax - 85.0
 
-    specshow(
-        sound_spec,
-        ax=axs[1, 0],
-        vmax=vmax,
-        vmin=vmin,
-        x_axis="time",
-        y_axis="linear",
-        sr=sample_rate,
-    )
-    axs[1, 0].xaxis.set_major_locator(plt.MaxNLocator(5))
-    axs[1, 0].set_ylim([0, sample_rate // 2])
-
-    specshow(
-        transformed_sound_spec,
-        ax=axs[1, 1],
-        vmax=vmax,
-        vmin=vmin,
-        x_axis="time",
-        y_axis="linear",
-        sr=sample_rate,
-    )
-    axs[1, 1].xaxis.set_major_locator(plt.MaxNLocator(5))
+    for ax, spec in ((axs[1, 0], sound_spec), (axs[1, 1], transformed_sound_spec)):
+        ax.imshow(
+            spec,
+            origin="lower",
+            aspect="auto",
+            extent=[0, spec.shape[-1] * hop_length / sample_rate, 0, sample_rate / 2],
+            vmin=vmin,
+            vmax=vmax,
+            cmap="magma",
+            interpolation="nearest",
+        )
+        ax.xaxis.set_major_locator(plt.MaxNLocator(5))
+        ax.set_xlabel("Time")
+    axs[1, 0].set_ylabel("Hz")
     axs[1, 1].set_yticks([])
     axs[1, 1].set_yticklabels([])
-    axs[1, 1].set_ylabel("")
 
-    plt.tight_layout(pad=0.1)
+    fig.subplots_adjust(
+        left=0.08, right=0.98, top=0.94, bottom=0.1, wspace=0.05, hspace=0.15
+    )
+
+    fig.canvas.draw()
+    image = Image.frombuffer(
+        "RGBA",
+        fig.canvas.get_width_height(),
+        fig.canvas.buffer_rgba(),
+        "raw",
+        "RGBA",
+        0,
+        1,
+    )
+    image.save(output_file_path, "webp", lossless=True, quality=100, method=0)
+
 
-    plt.savefig(output_file_path, dpi=200)
-    plt.close(fig)
+def seed_rngs(seed):
+    random.seed(seed)
+    np.random.seed(seed)
 
 
 class TransformUsageExample:
     transform_class = None
+    seed = 345
 
     def generate_example(self) -> Tuple[NDArray, NDArray, int]:
         pass
@@ -144,8 +207,7 @@ class AddBackgroundNoiseExample(TransformUsageExample):
     transform_class = AddBackgroundNoise
 
     def generate_example(self):
-        random.seed(345)
-        np.random.seed(345)
+        seed_rngs(self.seed)
         transform = AddBackgroundNoise(
             sounds_path=librosa.example("pistachio"),
             min_snr_in_db=5.0,
@@ -153,11 +215,7 @@ class AddBackgroundNoiseExample(TransformUsageExample):
             p=1.0,
         )
 
-        sound, sample_rate = load_sound_file(
-            librosa.example("libri1"), sample_rate=16000
-        )
-
-        sound = sound[..., 0 : int(4.7 * sample_rate)]
+        sound, sample_rate = load_example_sound()
 
         transformed_sound = transform(sound, sample_rate)
 
@@ -169,14 +227,10 @@ class AddGaussianNoiseExample(TransformUsageExample):
     transform_class = AddGaussianNoise
 
     def generate_example(self):
-        random.seed(345)
-        np.random.seed(345)
+        seed_rngs(self.seed)
         transform = AddGaussianNoise(min_amplitude=0.01, max_amplitude=0.01, p=1.0)
 
-        sound, sample_rate = load_sound_file(
-            librosa.example("libri1"), sample_rate=16000
-        )
-        sound = sound[..., 0 : int(4.7 * sample_rate)]
+        sound, sample_rate = load_example_sound()
 
         transformed_sound = transform(sound, sample_rate)
 
@@ -188,14 +242,10 @@ class RoomSimulatorExample(TransformUsageExample):
     transform_class = RoomSimulator
 
     def generate_example(self):
-        random.seed(345)
-        np.random.seed(345)
+        seed_rngs(self.seed)
         transform = RoomSimulator(p=1)
 
-        sound, sample_rate = load_sound_file(
-            librosa.example("libri1"), sample_rate=16000
-        )
-        sound = sound[..., 0 : int(4.7 * sample_rate)]
+        sound, sample_rate = load_example_sound()
 
         transformed_sound = transform(sound, sample_rate)
 
@@ -207,14 +257,10 @@ class SevenBandParametricEQExample(TransformUsageExample):
     transform_class = SevenBandParametricEQ
 
     def generate_example(self):
-        random.seed(345)
-        np.random.seed(345)
+        seed_rngs(self.seed)
         transform = SevenBandParametricEQ(min_gain_db=3.0, max_gain_db=3.0, p=1)
 
-        sound, sample_rate = load_sound_file(
-            librosa.example("libri1"), sample_rate=16000
-        )
-        sound = sound[..., 0 : int(4.7 * sample_rate)]
+        sound, sample_rate = load_example_sound()
 
         transformed_sound = transform(sound, sample_rate)
 
@@ -226,14 +272,10 @@ class ShiftExample(TransformUsageExample):
     transform_class = Shift
 
     def generate_example(self):
-        random.seed(345)
-        np.random.seed(345)
+        seed_rngs(self.seed)
         transform = Shift(min_fraction=0.75, max_fraction=0.75, rollover=True, p=1)
 
-        sound, sample_rate = load_sound_file(
-            librosa.example("libri1"), sample_rate=16000
-        )
-        sound = sound[..., 0 : int(4.7 * sample_rate)]
+        sound, sample_rate = load_example_sound()
 
         transformed_sound = transform(sound, sample_rate)
 
@@ -245,14 +287,10 @@ class TanhDistortionExample(TransformUsageExample):
     transform_class = TanhDistortion
 
     def generate_example(self):
-        random.seed(345)
-        np.random.seed(345)
+        seed_rngs(self.seed)
         transform = TanhDistortion(min_distortion=0.25, max_distortion=0.25, p=1.0)
 
-        sound, sample_rate = load_sound_file(
-            librosa.example("libri1"), sample_rate=16000
-        )
-        sound = sound[..., 0 : int(4.7 * sample_rate)]
+        sound, sample_rate = load_example_sound()
 
         transformed_sound = transform(sound, sample_rate)
 
@@ -264,8 +302,7 @@ class TimeStretchExample(TransformUsageExample):
     transform_class = TimeStretch
 
     def generate_example(self):
-        random.seed(345)
-        np.random.seed(345)
+        seed_rngs(self.seed)
         transform = TimeStretch(
             min_rate=1.25,
             max_rate=1.25,
@@ -273,11 +310,7 @@ class TimeStretchExample(TransformUsageExample):
             p=1.0,
         )
 
-        sound, sample_rate = load_sound_file(
-            librosa.example("libri1"), sample_rate=16000
-        )
-
-        sound = sound[..., 0 : int(4.7 * sample_rate)]
+        sound, sample_rate = load_example_sound()
 
         transformed_sound = transform(sound, sample_rate)
 
@@ -289,71 +322,86 @@ class TrimExample(TransformUsageExample):
     transform_class = Trim
 
     def generate_example(self):
-        random.seed(345)
-        np.random.seed(345)
+        seed_rngs(self.seed)
         transform = Trim(p=1.0)
 
-        sound, sample_rate = load_sound_file(
-            librosa.example("libri1"), sample_rate=16000
-        )
-
-        sound = sound[..., 0 : int(4.7 * sample_rate)]
+        sound, sample_rate = load_example_sound()
 
         transformed_sound = transform(sound, sample_rate)
 
         return sound, transformed_sound, sample_rate
 
 
+def generate_and_save_example(transform_name):
+    """Generate the named transform's example and write its plot and audio files."""
+    transform_class = next(
+        c for c in transform_usage_example_classes if c.__name__ == transform_name
+    )
+    transform_usage_example_class = transform_usage_example_classes[transform_class]
+    (
+        sound,
+        transformed_sound,
+        sample_rate,
+    ) = transform_usage_example_class().generate_example()
+    transformed_sound = transformed_sound.astype(np.float32, copy=False)
+    plot_waveforms_and_spectrograms(
+        sound,
+        transformed_sound,
+        sample_rate,
+        output_file_path=OUTPUT_DIR / f"{transform_name}.webp",
+    )
+
+    # compression_level is in [0, 1]; 0.125 is libFLAC level 1 of 0-8
+    for suffix, samples in (("input", sound), ("transformed", transformed_sound)):
+        soundfile.write(
+            OUTPUT_DIR / f"{transform_name}_{suffix}.flac",
+            samples,
+            sample_rate,
+            subtype="PCM_16",
+            compression_level=0.125,
+        )
+
+
+def positive_int(value):
+    value = int(value)
+    if value < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return value
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--transform",
         dest="transform_name",
         type=str,
-        required=True,
+        required=False,
+        default=None,
         choices=[c.__name__ for c in transform_usage_example_classes],
+        help="Generate the example for this transform only. If not specified,"
+        " examples are generated for all registered transforms.",
+    )
+    parser.add_argument(
+        "--workers",
+        dest="num_workers",
+        type=positive_int,
+        required=False,
+        default=None,
+        help="Number of worker processes to use. Defaults to the number of CPUs.",
     )
     args = parser.parse_args()
-    BASE_DIR = Path(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
-    for transform_class in transform_usage_example_classes:
-        if transform_class.__name__.lower() != args.transform_name.lower():
-            continue
-        transform_usage_example_class = transform_usage_example_classes[transform_class]
-        (
-            sound,
-            transformed_sound,
-            sample_rate,
-        ) = transform_usage_example_class().generate_example()
-        output_file_path = (
-            BASE_DIR
-            / "docs"
-            / "waveform_transforms"
-            / f"{transform_class.__name__}.png"
-        )
-        plot_waveforms_and_spectrograms(
-            sound,
-            transformed_sound,
-            sample_rate,
-            output_file_path=output_file_path,
-        )
-        Image.open(output_file_path).save(
-            output_file_path.with_suffix(".webp"), "webp", lossless=True, quality=100
-        )
-        os.remove(output_file_path)
-
-        soundfile.write(
-            BASE_DIR
-            / "docs"
-            / "waveform_transforms"
-            / f"{transform_class.__name__}_input.flac",
-            sound,
-            sample_rate,
-        )
-        soundfile.write(
-            BASE_DIR
-            / "docs"
-            / "waveform_transforms"
-            / f"{transform_class.__name__}_transformed.flac",
-            transformed_sound,
-            sample_rate,
-        )
+    transform_names = [
+        c.__name__
+        for c in transform_usage_example_classes
+        if args.transform_name is None
+        or c.__name__.lower() == args.transform_name.lower()
+    ]
+    if len(transform_names) == 1 or args.num_workers == 1:
+        for transform_name in transform_names:
+            generate_and_save_example(transform_name)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=args.num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            list(executor.map(generate_and_save_example, transform_names))
@@ -68,6 +68,17 @@ class TestLoadSoundFiles:
         assert max_value > 0.5
         assert max_value < 1.0
 
+    def test_load_mono_signed_16_bit_wav_with_duration(self):
+        samples, sample_rate = load_sound_file(
+            os.path.join(DEMO_DIR, "acoustic_guitar_0.wav"),
+            sample_rate=None,
+            duration=2.5,
+        )
+        assert sample_rate == 16000
+        assert samples.dtype == np.float32
+        assert samples.ndim == 1
+        assert samples.shape[0] == 40000
+
     def test_load_stereo_signed_16_bit_wav(self):
         samples, sample_rate = load_sound_file(
             os.path.join(DEMO_DIR, "stereo_16bit.wav"), sample_rate=None